@@ -1,104 +1,229 @@
 import git
 import random
 from datetime import datetime, timedelta
-from faker import Faker
+import numpy as np
 import os
 import subprocess
-from collections import defaultdict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, namedtuple
 import requests
+from requests.adapters import HTTPAdapter
+
+_RNG = random.Random()
+
+_GH_SESSION = requests.Session()
+_GH_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_GH_SESSION.headers["Accept"] = "application/vnd.github.v3+json"
+
+CommitRecord = namedtuple('CommitRecord', ['sha', 'tree_sha', 'message'])
+
+_CHUNK_SIZE = 1000
+
+# Import target outside refs/heads/ so it can't collide with a cloned branch
+_REBASED_REF = 'refs/crackify/rebased'
 
 def get_weighted_date():
     """Generate a random date in the past year with weekend/evening bias"""
-    fake = Faker()
-    # Base date range - past year
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=365)
+    rng = _RNG
+    # Base date range - past year, as epoch seconds
+    end = int(datetime.now().timestamp())
+    start = end - 365 * 86400
     
-    # Get a random date
-    date = fake.date_time_between(start_date=start_date, end_date=end_date)
+    # Get a random date, as local wall-clock seconds
+    epoch = start + rng.randrange(end - start)
+    utc_offset = _local_utc_offset(epoch)
+    epoch += utc_offset
     
-    # Weight adjustments
-    if date.weekday() >= 5:  # Weekend
-        date += timedelta(hours=random.randint(12, 23))  # Evening bias
+    # Weight adjustments - 1970-01-01 was a Thursday
+    if (epoch // 86400 + 4) % 7 >= 5:  # Weekend
+        epoch += rng.randrange(12, 24) * 3600  # Evening bias
     else:
         # Weekdays - 60% chance of evening (6pm-11pm)
-        if random.random() < 0.6:
-            date = date.replace(hour=random.randint(18, 23))
+        if rng.random() < 0.6:
+            epoch += (rng.randrange(18, 24) - epoch % 86400 // 3600) * 3600
     
-    return date
+    return datetime.fromtimestamp(epoch - utc_offset)
 
-def get_git_config(key):
-    """Get a git config value"""
+def _local_utc_offset(epoch: int = None) -> int:
+    """Seconds east of UTC for the local timezone at epoch (default: now)"""
+    moment = datetime.now() if epoch is None else datetime.fromtimestamp(epoch)
+    return int(moment.astimezone().utcoffset().total_seconds())
+
+def _local_utc_offsets(ts: np.ndarray) -> np.ndarray:
+    """Seconds east of UTC for the local timezone at each timestamp"""
+    # DST changes on hour boundaries, so one lookup per distinct hour is exact
+    hours, inverse = np.unique(ts // 3600, return_inverse=True)
+    offsets = np.array([_local_utc_offset(int(hour) * 3600) for hour in hours], dtype=np.int64)
+    return offsets[inverse.reshape(ts.shape)]
+
+def get_weighted_epochs(count: int) -> tuple:
+    """Generate sorted POSIX timestamps in the past year with weekend/evening bias in local time.
+    
+    Returns the timestamps and the local UTC offset in effect at each one.
+    """
+    now = datetime.now()
+    start = int((now - timedelta(days=365)).timestamp())
+    end = int(now.timestamp())
+    ts = np.random.randint(start, end, size=count, dtype=np.int64)
+    # Bias is applied to local wall-clock seconds, shifted back to UTC at the end
+    utc_offsets = _local_utc_offsets(ts)
+    ts += utc_offsets
+    
+    # 1970-01-01 was a Thursday
+    weekday = ((ts // 86400) + 4) % 7
+    weekend = weekday >= 5
+    
+    # Weekend - evening bias
+    ts[weekend] += np.random.randint(12, 24, size=int(weekend.sum())) * 3600
+    
+    # Weekdays - 60% chance of evening (6pm-11pm)
+    evening = ~weekend & (np.random.random(count) < 0.6)
+    picked = ts[evening]
+    hours = np.random.randint(18, 24, size=picked.size)
+    ts[evening] = picked - picked % 86400 + hours * 3600 + picked % 3600
+    
+    ts -= utc_offsets
+    ts.sort()
+    return ts, _local_utc_offsets(ts)
+
+@lru_cache(maxsize=None)
+def _load_git_config() -> dict:
+    """Read the whole global git config once"""
     try:
-        return subprocess.check_output(['git', 'config', '--global', key]).decode().strip()
+        out = subprocess.check_output(
+            ['git', 'config', '--global', '--list'], stderr=subprocess.DEVNULL
+        ).decode()
     except subprocess.CalledProcessError:
-        return None
+        return {}
+    return dict(line.split('=', 1) for line in out.splitlines() if '=' in line)
+
+def get_git_config(key):
+    """Get a git config value"""
+    # --list lowercases section and variable names; subsections keep their case
+    section, _, rest = key.partition('.')
+    subsection, _, name = rest.rpartition('.')
+    key = '.'.join(filter(None, [section.lower(), subsection, name.lower()]))
+    return _load_git_config().get(key)
 
 def create_github_repo(repo_name, token):
     """Create a new repository on GitHub"""
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    _GH_SESSION.headers["Authorization"] = f"token {token}"
     data = {
         "name": repo_name,
         "private": False,
         "auto_init": False
     }
-    response = requests.post("https://api.github.com/user/repos", json=data, headers=headers)
+    response = _GH_SESSION.post("https://api.github.com/user/repos", json=data, timeout=10)
     if response.status_code != 201:
         raise Exception(f"Failed to create repository: {response.json().get('message', 'Unknown error')}")
     return response.json()['ssh_url']
 
-def clone_and_prepare_repo(repo_url: str, output_dir: str, push_url: str = None) -> git.Repo:
-    """Clone repository and prepare for rebasing"""
+def clone_and_prepare_repo(repo_url: str, output_dir: str, need_tags: bool = True) -> git.Repo:
+    """Bare-clone repository without blobs or a working tree and prepare for rebasing"""
     print(f"Cloning {repo_url}...")
-    repo = git.Repo.clone_from(repo_url, output_dir)
-    
-    if push_url:
-        repo.delete_remote('origin')
-    return repo
+    # The original remote stays as 'upstream' so missing blobs can be fetched lazily on push
+    cmd = ['git', 'clone', '--bare', '--origin', 'upstream']
+    if os.path.isdir(repo_url):
+        # Hardlink objects from a local repository; partial clone filters don't apply here
+        cmd.append('--local')
+    else:
+        cmd.append('--filter=blob:none')
+    if not need_tags:
+        cmd.append('--no-tags')
+    subprocess.run(cmd + [repo_url, output_dir], check=True)
+    return git.Repo(output_dir)
 
 def get_main_branch_commits(repo: git.Repo) -> list:
-    """Get commits from the main branch"""
+    """Get commits from the main branch, oldest first"""
     branch_names = ['main', 'master', 'stable']
-    for branch in branch_names:
-        try:
-            commits = list(repo.iter_commits(branch))
-            print(f"Using branch: {branch}")
-            return commits
-        except git.exc.GitCommandError:
+    refs = subprocess.check_output(
+        ['git', '-C', repo.working_dir, 'for-each-ref', '--format=%(refname:lstrip=2)', 'refs/heads/']
+    ).decode().split()
+    branch = next((name for name in branch_names if name in refs), None)
+    if branch is None:
+        raise Exception("Could not find any of the standard branches (main, master, stable)")
+    print(f"Using branch: {branch}")
+    
+    log = subprocess.check_output(
+        ['git', '-C', repo.working_dir, 'log', '--reverse', '--format=%H%x00%T%x00%B%x00%x00', f'refs/heads/{branch}', '--']
+    )
+    commits = []
+    for entry in log.split(b'\x00\x00\n'):
+        if not entry:
             continue
-    raise Exception("Could not find any of the standard branches (main, master, stable)")
+        sha, tree_sha, message = entry.split(b'\x00', 2)
+        commits.append(CommitRecord(sha.decode(), tree_sha.decode(), message))
+    return commits
+
+def _format_commit_chunk(commits: list, epochs: list, utc_offsets: list, ident: bytes, first_mark: int) -> bytes:
+    """Serialize a run of consecutive commits as fast-import commit directives"""
+    records = []
+    ref = _REBASED_REF.encode()
+    for mark, (commit, epoch, utc_offset) in enumerate(zip(commits, epochs, utc_offsets), start=first_mark):
+        message = commit.message
+        sign = b'-' if utc_offset < 0 else b'+'
+        tz = b"%s%02d%02d" % (sign, abs(utc_offset) // 3600, abs(utc_offset) % 3600 // 60)
+        records += [
+            b"commit %s\n" % ref,
+            b"mark :%d\n" % mark,
+            b"author %s %d %s\n" % (ident, epoch, tz),
+            b"committer %s %d %s\n" % (ident, epoch, tz),
+            b"data %d\n%s\n" % (len(message), message),
+        ]
+        if mark > 1:
+            records.append(b"from :%d\n" % (mark - 1))
+        # Reuse the original tree object by SHA, nothing is staged or checked out
+        records.append(b'M 040000 %s ""\n\n' % commit.tree_sha.encode())
+    return b"".join(records)
 
 def create_rebased_commits(repo: git.Repo, commits: list, new_name: str, new_email: str) -> None:
-    """Create new commits with updated author info and dates"""
-    commit_dates = sorted([get_weighted_date() for _ in commits])
-    repo.git.checkout('--orphan', 'rebased')
-    
-    for i, commit in enumerate(commits):
-        new_date = commit_dates[i]
-        env = os.environ.copy()
-        env['GIT_AUTHOR_DATE'] = new_date.isoformat()
-        env['GIT_COMMITTER_DATE'] = new_date.isoformat()
-        
-        repo.git.read_tree(commit.hexsha)
-        repo.git.checkout_index('-a', '-f')
-        repo.git.add('--all')
-        
-        if repo.git.status('--porcelain'):
-            repo.git.commit(
-                '-m', commit.message,
-                author=f"{new_name} <{new_email}>",
-                env=env
-            )
-        else:
-            repo.git.commit(
-                '--allow-empty',
-                '-m', commit.message,
-                author=f"{new_name} <{new_email}>",
-                env=env
-            )
+    """Create new commits with updated author info and dates in a single fast-import stream"""
+    # Raw '<epoch> <tz>' dates need no parsing on git's side
+    epochs, utc_offsets = get_weighted_epochs(len(commits))
+    epochs, utc_offsets = epochs.tolist(), utc_offsets.tolist()
+    ident = f"{new_name} <{new_email}>".encode()
+    
+    fast_import = subprocess.Popen(
+        ['git', 'fast-import', '--date-format=raw', '--quiet'],
+        stdin=subprocess.PIPE,
+        cwd=repo.working_dir
+    )
+    # Workers format chunks ahead of the writer; marks run on across chunks so they
+    # stay sequential. At most 2 chunks per worker are in flight to bound memory.
+    workers = os.cpu_count() or 1
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for start in range(0, len(commits), _CHUNK_SIZE):
+                    pending.append(executor.submit(
+                        _format_commit_chunk,
+                        commits[start:start + _CHUNK_SIZE],
+                        epochs[start:start + _CHUNK_SIZE],
+                        utc_offsets[start:start + _CHUNK_SIZE],
+                        ident,
+                        start + 1
+                    ))
+                    if len(pending) >= 2 * workers:
+                        fast_import.stdin.write(pending.popleft().result())
+                while pending:
+                    fast_import.stdin.write(pending.popleft().result())
+            except BrokenPipeError:
+                # fast-import exited early, its return code is reported below
+                pass
+    except BaseException:
+        # Don't let fast-import finish a partial history
+        fast_import.kill()
+        raise
+    finally:
+        try:
+            fast_import.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = fast_import.wait()
+    if returncode != 0:
+        raise Exception(f"git fast-import failed while rewriting commits (exit code {returncode})")
 
 def push_to_new_remote(repo: git.Repo, push_url: str, token: str = None) -> None:
     """Push rebased repository to new remote"""
@@ -112,22 +237,55 @@ def push_to_new_remote(repo: git.Repo, push_url: str, token: str = None) -> None
     
     print(f"Pushing to new remote: {actual_push_url}")
     repo.create_remote('origin', actual_push_url)
-    repo.git.push('origin', '--force', '--all')
-    repo.git.push('origin', '--force', '--tags')
+    result = subprocess.run([
+        'git', '-C', repo.working_dir, '-c', 'pack.threads=0',
+        'push', '--force', '--atomic', 'origin',
+        'refs/heads/*:refs/heads/*', 'refs/tags/*:refs/tags/*'
+    ], capture_output=True, text=True)
+    if result.returncode != 0:
+        if 'does not support --atomic' not in result.stderr:
+            raise Exception(f"Push failed: {result.stderr.strip()}")
+        # Remote can't do atomic pushes, push branches and tags separately
+        repo.git.push('origin', '--force', '--all')
+        repo.git.push('origin', '--force', '--tags')
     print("Push complete! All branches and tags pushed to new remote.")
 
-def rebase_repo(repo_url: str, output_dir: str, new_name: str, new_email: str, push_url: str = None) -> None:
+def rebase_repo(repo_url: str, output_dir: str, new_name: str, new_email: str, push_url: str = None, need_tags: bool = True, repack: bool = True, token: str = None) -> None:
     """Rebase repository with new author info and redistributed dates"""
-    repo = clone_and_prepare_repo(repo_url, output_dir, push_url)
+    repo = clone_and_prepare_repo(repo_url, output_dir, need_tags)
     commits = get_main_branch_commits(repo)
     create_rebased_commits(repo, commits, new_name, new_email)
     
     # Move rebased branch to main
-    repo.git.branch('-M', 'rebased', 'main')
-    print(f"Rebase complete! Repository saved to {output_dir}")
+    repo.git.update_ref('refs/heads/main', _REBASED_REF)
+    repo.git.update_ref('-d', _REBASED_REF)
+    repo.git.symbolic_ref('HEAD', 'refs/heads/main')
+    
+    # A bare clone copies every upstream branch; drop the unrewritten ones
+    heads = subprocess.check_output(
+        ['git', '-C', repo.working_dir, 'for-each-ref', '--format=%(refname)', 'refs/heads/']
+    ).decode().split()
+    stale = ''.join(f"delete {ref}\n" for ref in heads if ref != 'refs/heads/main')
+    if stale:
+        subprocess.run(
+            ['git', '-C', repo.working_dir, 'update-ref', '--stdin'],
+            input=stale.encode(),
+            check=True
+        )
+    
+    if repack:
+        # Fold fast-import's pack into one, using all cores for delta compression.
+        # Existing deltas are reused; bitmaps need full object closure, which a
+        # blobless clone doesn't have.
+        subprocess.run(
+            ['git', '-C', repo.working_dir, '-c', 'pack.threads=0', '-c', 'repack.writeBitmaps=false',
+             'repack', '-ad'],
+            check=True
+        )
+    print(f"Rebase complete! Bare repository saved to {output_dir}")
     
     if push_url:
-        push_to_new_remote(repo, push_url, args.token)
+        push_to_new_remote(repo, push_url, token)
 
 if __name__ == "__main__":
     import argparse
@@ -139,6 +297,8 @@ if __name__ == "__main__":
     parser.add_argument('--email', help='New author email (default: git config user.email)')
     parser.add_argument('--push-url', help='URL to push the rebased repository to')
     parser.add_argument('--token', help='GitHub token (default: git config github.token)')
+    parser.add_argument('--no-tags', dest='tags', action='store_false', help='Do not clone or push tags')
+    parser.add_argument('--no-repack', dest='repack', action='store_false', help='Skip repacking the rewritten repository')
     
     args = parser.parse_args()
     
@@ -164,9 +324,9 @@ if __name__ == "__main__":
         if repo_name.endswith('.git'):
             repo_name = repo_name[:-4]
             
-        # Get GitHub token
-        token = args.token or get_git_config('github.token')
-        if not token:
+        # Get GitHub token, resolved here so the push doesn't look it up again
+        args.token = args.token or get_git_config('github.token')
+        if not args.token:
             raise Exception("GitHub token not found. Please provide --token or set with: git config --global github.token YOUR_TOKEN")
             
         # Generate the push URL but don't create the repo yet
@@ -177,5 +337,8 @@ if __name__ == "__main__":
         output_dir=args.output_dir,
         new_name=args.name,
         new_email=args.email,
-        push_url=args.push_url
+        push_url=args.push_url,
+        need_tags=args.tags,
+        repack=args.repack,
+        token=args.token
     )